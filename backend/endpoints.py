@@ -1,3 +1,5 @@
+import os
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timezone
 
 from flask import Blueprint, abort, jsonify, request, send_from_directory
@@ -6,6 +8,22 @@ from backend.app_config import IMG_DIRS
 
 endpoints = Blueprint("endpoints", __name__)
 
+# per-datatype sorted filename index, invalidated by directory mtime
+_INDEX = {}
+
+
+def _parse_compact_utc(s: str) -> datetime:
+    # <YYYYMMDDHHMMSS> by direct slicing; much faster than strptime
+    return datetime(
+        int(s[0:4]),
+        int(s[4:6]),
+        int(s[6:8]),
+        int(s[8:10]),
+        int(s[10:12]),
+        int(s[12:14]),
+        tzinfo=timezone.utc,
+    )
+
 
 def extract_timestamp_and_score(filename: str):
     name = filename[:-4]  # remove .png
@@ -13,7 +31,7 @@ def extract_timestamp_and_score(filename: str):
 
     # new format: ..._<YYYYMMDDHHMMSS>_<score>.png
     if len(parts) >= 2 and len(parts[-2]) == 14 and parts[-2].isdigit():
-        ts = datetime.strptime(parts[-2], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+        ts = _parse_compact_utc(parts[-2])
         try:
             score = float(parts[-1])
         except ValueError:
@@ -22,12 +40,46 @@ def extract_timestamp_and_score(filename: str):
 
     # old format: ..._<YYYYMMDDHHMMSS>.png
     if len(parts) >= 1 and len(parts[-1]) == 14 and parts[-1].isdigit():
-        ts = datetime.strptime(parts[-1], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+        ts = _parse_compact_utc(parts[-1])
         return ts, None
 
     raise ValueError(f"Cannot parse timestamp from filename: {filename}")
 
 
+def _directory_index(datatype, directory):
+    try:
+        mtime = os.stat(directory).st_mtime
+    except FileNotFoundError:
+        # folder not created by the fetcher yet: behave like an empty one
+        return {"mtime": None, "timestamps": [], "entries": []}
+    cached = _INDEX.get(datatype)
+    if cached is not None and cached["mtime"] == mtime:
+        return cached
+
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".png"):
+                    continue
+                try:
+                    ts, rain_score = extract_timestamp_and_score(entry.name)
+                except ValueError:
+                    continue
+                entries.append((ts, rain_score, entry.name))
+    except FileNotFoundError:
+        return {"mtime": None, "timestamps": [], "entries": []}
+    entries.sort(key=lambda e: e[0])
+
+    cached = {
+        "mtime": mtime,
+        "timestamps": [e[0] for e in entries],
+        "entries": entries,
+    }
+    _INDEX[datatype] = cached
+    return cached
+
+
 def parse_isoformat_z(dt_str: str) -> datetime:
     if dt_str.endswith("Z"):
         dt_str = dt_str.replace("Z", "+00:00")
@@ -51,23 +103,19 @@ def list_files(datatype):
     except ValueError:
         abort(400, "Invalid ISO datetime format")
 
+    index = _directory_index(datatype, directory)
+    lo = bisect_left(index["timestamps"], start_dt)
+    hi = bisect_right(index["timestamps"], end_dt)
+
     results = []
-    for file_path in directory.glob("*.png"):
-        try:
-            ts, rain_score = extract_timestamp_and_score(file_path.name)
-        except ValueError:
-            continue
-
-        if start_dt <= ts <= end_dt:
-            item = {
-                "timestamp": ts.isoformat(),
-                "url": f"/{datatype}/{file_path.name}",
-            }
-            if rain_score is not None:
-                item["rain_score"] = rain_score
-            results.append(item)
-
-    results.sort(key=lambda x: x["timestamp"])
+    for ts, rain_score, name in index["entries"][lo:hi]:
+        item = {
+            "timestamp": ts.isoformat(),
+            "url": f"/{datatype}/{name}",
+        }
+        if rain_score is not None:
+            item["rain_score"] = rain_score
+        results.append(item)
     return jsonify(results)
 
 
@@ -1,6 +1,10 @@
 import argparse
 import logging
+import os
+import re
+import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
@@ -89,6 +93,13 @@ def convert_merge1h_to_png(hdf_path: Path, output_folder: Path):
     return final_output_path
 
 
+CONVERTERS = {
+    "maxz": (convert_maxz_to_png, MAXZ_PNG_FOLDER),
+    "merge1h": (convert_merge1h_to_png, MERGE1H_PNG_FOLDER),
+    "pseudocappi2km": (convert_cappi_to_png, CAPPI2KM_PNG_FOLDER),
+}
+
+
 def setup_logging(level, log_file):
     formatter = logging.Formatter(
         "[%(asctime)s] [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S"
@@ -106,24 +117,46 @@ def setup_logging(level, log_file):
 
 def parse_filename_utc(filename):
     try:
-        datetime_str = filename.split("_")[-1].replace(".hdf", "")
-        return datetime.strptime(datetime_str, "%Y%m%d%H%M%S").replace(
-            tzinfo=timezone.utc
+        s = filename.split("_")[-1].replace(".hdf", "")
+        # <YYYYMMDDHHMMSS> by direct slicing; much faster than strptime
+        return datetime(
+            int(s[0:4]),
+            int(s[4:6]),
+            int(s[6:8]),
+            int(s[8:10]),
+            int(s[10:12]),
+            int(s[12:14]),
+            tzinfo=timezone.utc,
         )
     except Exception as e:
         logging.warning(f"Failed to parse datetime from {filename}: {e}")
         return None
 
 
+# matches hrefs to .hdf files in the listing page, scanned over raw bytes
+_HREF_RE = re.compile(rb'href="([^"]+\.hdf)"')
+
+# folder_url -> (Last-Modified header, parsed links) for conditional GETs
+_listing_cache = {}
+
+
 def get_file_links(folder_url):
     try:
-        response = session.get(folder_url, timeout=10)
+        cached = _listing_cache.get(folder_url)
+        headers = {"If-Modified-Since": cached[0]} if cached else {}
+        response = session.get(folder_url, timeout=10, headers=headers)
+        if response.status_code == 304:
+            logging.debug(f"Listing not modified: {folder_url}")
+            return cached[1]
         response.raise_for_status()
-        return [
-            folder_url + line.split('"')[1]
-            for line in response.text.splitlines()
-            if ".hdf" in line and 'href="' in line
+        links = [
+            folder_url + match.group(1).decode()
+            for match in _HREF_RE.finditer(response.content)
         ]
+        last_modified = response.headers.get("Last-Modified")
+        if last_modified:
+            _listing_cache[folder_url] = (last_modified, links)
+        return links
     except Exception as e:
         error_msg = f"Failed to fetch from {folder_url}: {e}"
         logging.error(error_msg)
@@ -145,8 +178,7 @@ def download_file(file_url, local_folder: Path):
             total = int(response.headers.get("content-length", 0))
             logging.info(f"Downloading {file_name} ({total} bytes)")
             with open(local_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+                shutil.copyfileobj(response.raw, f, length=1024 * 1024)
         logging.info(f"Downloaded: {local_path.as_posix()}")
         return True
     except Exception as e:
@@ -165,6 +197,36 @@ def sleep_until_next_interval(interval_seconds):
     time.sleep(sleep_duration)
 
 
+def convert_downloaded_file(local_folder: Path, file_name: str):
+    converter, png_folder = CONVERTERS[local_folder.name]
+    try:
+        converter(local_folder / file_name, png_folder)
+    except Exception as e:
+        error_msg = f"Failed to convert {file_name} to PNG: {e}"
+        logging.error(error_msg)
+        notify_discord(error_msg)
+
+
+def process_folder(folder_url, local_folder: Path, seen: set, convert_pool):
+    logging.info(f"Checking: {folder_url}")
+    links = get_file_links(folder_url)
+
+    # hand each finished download to the conversion pool so encoding file N
+    # does not block downloading file N+1
+    conversions = []
+    for file_url in links:
+        file_name = Path(file_url).name
+        if file_name in seen:
+            continue
+        if download_file(file_url, local_folder):
+            seen.add(file_name)
+            conversions.append(
+                convert_pool.submit(convert_downloaded_file, local_folder, file_name)
+            )
+    for future in conversions:
+        future.result()
+
+
 def main(check_every):
     for folder in FOLDER_MAPPINGS.values():
         folder.mkdir(parents=True, exist_ok=True)
@@ -177,45 +239,20 @@ def main(check_every):
     logging.info("Started CHMI radar data fetcher (interval: %d s)", check_every)
     # notify_discord(":satellite: CHMI radar data fetcher started.")
 
-    while True:
-        for folder_url, local_folder in FOLDER_MAPPINGS.items():
-            logging.info(f"Checking: {folder_url}")
-            links = get_file_links(folder_url)
-
-            for file_url in links:
-                file_name = Path(file_url).name
-                if file_name not in downloaded_files[folder_url]:
-                    success = download_file(file_url, local_folder)
-                    if success:
-                        downloaded_files[folder_url].add(file_name)
-                        if local_folder.name == "maxz":
-                            try:
-                                convert_maxz_to_png(
-                                    local_folder / file_name, MAXZ_PNG_FOLDER
-                                )
-                            except Exception as e:
-                                error_msg = f"Failed to convert {file_name} to PNG: {e}"
-                                logging.error(error_msg)
-                                notify_discord(error_msg)
-                        if local_folder.name == "merge1h":
-                            try:
-                                convert_merge1h_to_png(
-                                    local_folder / file_name, MERGE1H_PNG_FOLDER
-                                )
-                            except Exception as e:
-                                error_msg = f"Failed to convert {file_name} to PNG: {e}"
-                                logging.error(error_msg)
-                                notify_discord(error_msg)
-                        if local_folder.name == "pseudocappi2km":
-                            try:
-                                convert_cappi_to_png(
-                                    local_folder / file_name, CAPPI2KM_PNG_FOLDER
-                                )
-                            except Exception as e:
-                                error_msg = f"Failed to convert {file_name} to PNG: {e}"
-                                logging.error(error_msg)
-                                notify_discord(error_msg)
-        sleep_until_next_interval(check_every)
+    # one worker per product folder; each seen-set is owned by its own worker
+    with ThreadPoolExecutor(max_workers=len(FOLDER_MAPPINGS)) as pool, ThreadPoolExecutor(
+        max_workers=os.cpu_count()
+    ) as convert_pool:
+        while True:
+            futures = [
+                pool.submit(
+                    process_folder, url, folder, downloaded_files[url], convert_pool
+                )
+                for url, folder in FOLDER_MAPPINGS.items()
+            ]
+            for future in futures:
+                future.result()
+            sleep_until_next_interval(check_every)
 
 
 if __name__ == "__main__":